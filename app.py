@@ -1,25 +1,63 @@
+import atexit
+import hmac
 import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
 import psycopg2
-from psycopg2.extras import RealDictCursor
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
 from flask import (
-    Flask, render_template, request, redirect,
+    Flask, Request, render_template, request, redirect,
     url_for, flash, session
 )
+from flask_caching import Cache
+from flask_session import Session
+import redis
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 
-# 🔹 Cloudinary
-import cloudinary
-import cloudinary.uploader
-
 # Cargar variables de entorno (.env)
 load_dotenv()
 
+
 # -----------------------
 # CONFIGURACIÓN BÁSICA
 # -----------------------
+class UploadRequest(Request):
+    """
+    Request que manda a un archivo temporal en disco cualquier archivo
+    subido de más de 64 KB, en lugar de irlo acumulando en memoria.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type,
+                         filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=64 * 1024, mode="w+b")
+
+
 app = Flask(__name__)
-app.config['SECRET_KEY'] = 'cambia-esta-clave-por-una-muy-larga'
+app.request_class = UploadRequest
+
+# La sesión guarda al usuario y a quién le da regalo (gives_to), y se le
+# cree tal cual. Con la clave de ejemplo (pública en el repo) cualquiera
+# podría firmar una cookie de otra persona: en Render es obligatoria.
+SECRET_KEY = os.getenv("SECRET_KEY")
+if os.getenv("RENDER") and not SECRET_KEY:
+    raise RuntimeError(
+        "SECRET_KEY no está definida. "
+        "En Render es obligatoria: firma las cookies de sesión."
+    )
+app.config['SECRET_KEY'] = SECRET_KEY or 'cambia-esta-clave-por-una-muy-larga'
+
+# Límite por request (fotos del celular incluidas)
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
@@ -27,47 +65,155 @@ UPLOAD_FOLDER = os.path.join(BASE_DIR, 'static', 'uploads')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# Archivos estáticos cacheados 30 días en el navegador
+# (las fotos de static/uploads, un año: ver cache_uploads)
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 60 * 60 * 24 * 30
+
+# Las fotos locales tienen nombre único (uuid) y nunca se sobrescriben,
+# así que el navegador las puede guardar sin volver a preguntar
+UPLOADS_URL_PREFIX = '/static/uploads/'
+UPLOADS_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
 # Formatos permitidos (ampliado)
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp', 'bmp'}
+ALLOWED_EXTENSIONS = frozenset({'png', 'jpg', 'jpeg', 'gif', 'webp', 'bmp'})
 
 # URL de la base de datos PostgreSQL (Render)
 DATABASE_URL = os.getenv("DATABASE_URL")
 
 # URL Cloudinary (Render / .env)
+# 🔹 El SDK se importa hasta la primera subida (ver get_cloudinary_uploader)
 CLOUDINARY_URL = os.getenv("CLOUDINARY_URL")
 
-if CLOUDINARY_URL:
-    # Configurar Cloudinary a partir de CLOUDINARY_URL
-    cloudinary.config(cloudinary_url=CLOUDINARY_URL)
+# En Render (producción) las fotos las sirve el CDN de Cloudinary: el disco
+# es efímero y Flask sirviendo imágenes byte por byte es lento. Sin
+# CLOUDINARY_URL mejor no arrancar. En local se sirven desde static/uploads.
+if os.getenv("RENDER") and not CLOUDINARY_URL:
+    raise RuntimeError(
+        "CLOUDINARY_URL no está definida. "
+        "En Render es obligatoria: las fotos se sirven desde Cloudinary."
+    )
+
+# URL de Redis (Render / .env). Si existe, la caché y las sesiones se
+# comparten entre workers; si no, se usa caché en memoria y la sesión
+# firmada en cookie de Flask.
+REDIS_URL = os.getenv("REDIS_URL")
+
+if REDIS_URL:
+    # Sesiones del lado del servidor: la cookie solo lleva el id de sesión
+    app.config.update(
+        SESSION_TYPE="redis",
+        SESSION_REDIS=redis.from_url(REDIS_URL),
+        SESSION_PERMANENT=False,
+    )
+    Session(app)
+
+    cache = Cache(app, config={
+        "CACHE_TYPE": "RedisCache",
+        "CACHE_REDIS_URL": REDIS_URL,
+        "CACHE_DEFAULT_TIMEOUT": 60,
+    })
+else:
+    cache = Cache(app, config={
+        "CACHE_TYPE": "SimpleCache",
+        "CACHE_DEFAULT_TIMEOUT": 60,
+    })
+
+
+def cache_not_shared() -> bool:
+    """
+    True si la caché vive en la memoria de cada worker (sin Redis).
+    Ahí invalidar solo limpia el worker que atendió el POST, así que
+    los datos que los usuarios editan no se guardan en la caché
+    (se usa como unless= en @cache.memoize).
+    """
+    return not REDIS_URL
+
+
+# Precalculado una sola vez (se usa en cada imagen)
+_SCHEMES = ('http://', 'https://')
 
 
 def allowed_file(filename: str) -> bool:
-    return (
-        filename
-        and '.' in filename
-        and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-    )
+    # Solo se pasa a minúsculas la extensión, y se busca en el frozenset
+    i = filename.rfind('.')
+    return i != -1 and filename[i + 1:].lower() in ALLOWED_EXTENSIONS
 
 
 def is_cloud_url(path: str) -> bool:
     """Devuelve True si el path parece ser una URL (Cloudinary)."""
-    if not path:
-        return False
-    return path.startswith("http://") or path.startswith("https://")
+    return bool(path) and path.startswith(_SCHEMES)
+
+
+def remove_local_image(filename: str) -> None:
+    """Borra del disco una imagen local (las URLs de Cloudinary se ignoran)."""
+    if not filename or is_cloud_url(filename):
+        return
+    path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        app.logger.warning("No se pudo borrar %s: %s", path, e)
+
+
+_cloudinary_uploader = None
+
+# Tamaño de cada parte en las subidas por partes a Cloudinary
+CLOUDINARY_CHUNK_SIZE = 6_000_000
+
+# Subidas a Cloudinary que pueden ir al mismo tiempo (hilos del executor
+# y también conexiones HTTPS que se mantienen abiertas)
+UPLOAD_WORKERS = 4
+
+
+def get_cloudinary_uploader():
+    """
+    Importa y configura Cloudinary la primera vez que se necesita.
+    Así el arranque no paga el import del SDK (y de requests/TLS)
+    cuando no hay CLOUDINARY_URL o nadie sube fotos.
+    """
+    global _cloudinary_uploader
+    if _cloudinary_uploader is None:
+        import cloudinary
+        import cloudinary.uploader
+        import cloudinary.utils
+
+        # Configurar Cloudinary a partir de CLOUDINARY_URL
+        cloudinary.config(cloudinary_url=CLOUDINARY_URL)
+
+        # El SDK ya comparte un PoolManager de urllib3, pero guarda solo
+        # 1 conexión por host: con varias subidas en paralelo las demás se
+        # tiran y la siguiente paga otra vez el handshake TLS. Se cambia
+        # por uno que guarda una conexión por hilo de subida.
+        cloudinary.uploader._http = cloudinary.utils.get_http_connector(
+            cloudinary.config(),
+            dict(cloudinary.CERT_KWARGS, maxsize=UPLOAD_WORKERS)
+        )
+        _cloudinary_uploader = cloudinary.uploader
+    return _cloudinary_uploader
 
 
-def upload_to_cloudinary(file_storage, folder: str) -> str | None:
+def upload_to_cloudinary(path: str, folder: str) -> str | None:
     """
-    Sube un archivo a Cloudinary y regresa la URL segura.
+    Sube un archivo (ya guardado en disco) a Cloudinary y regresa la URL segura.
+    Usa la subida por partes para no cargar la imagen completa en memoria.
     Si falla, regresa None (y no truena el servidor).
     """
     if not CLOUDINARY_URL:
         return None
 
+    # El public_id sale del nombre local (único): si la misma imagen se sube
+    # dos veces (p. ej. al re-subir pendientes) se sobrescribe, no se duplica
+    public_id = os.path.splitext(os.path.basename(path))[0]
+
     try:
-        result = cloudinary.uploader.upload(
-            file_storage,
-            folder=folder
+        result = get_cloudinary_uploader().upload_large(
+            path,
+            folder=folder,
+            public_id=public_id,
+            resource_type="image",
+            chunk_size=CLOUDINARY_CHUNK_SIZE
         )
         return result.get("secure_url")
     except Exception as e:
@@ -75,30 +221,382 @@ def upload_to_cloudinary(file_storage, folder: str) -> str | None:
         return None
 
 
+def local_image_name(prefix: str, filename: str) -> str:
+    """
+    Nombre único para guardar una imagen en UPLOAD_FOLDER.
+    No incluye nombres de personas (espacios, acentos) y dos fotos
+    llamadas igual nunca se pisan.
+    """
+    return f"{prefix}_{uuid.uuid4().hex}_{secure_filename(filename)}"
+
+
+def save_local_image(file_storage, local_name: str) -> str:
+    """
+    Guarda la imagen subida en UPLOAD_FOLDER y regresa su nombre local,
+    que es lo que se guarda en la BD mientras se sube a Cloudinary.
+    """
+    path = os.path.join(app.config["UPLOAD_FOLDER"], local_name)
+
+    # Copiar por bloques desde el stream de Werkzeug directo al disco
+    with open(path, "wb") as out:
+        shutil.copyfileobj(file_storage.stream, out, length=1 << 20)
+
+    return local_name
+
+
+# Subidas a Cloudinary en segundo plano: el usuario no espera
+# a que termine para recibir la respuesta
+UPLOAD_EXECUTOR = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="cloudinary")
+
+# Cambia el nombre local por la URL de Cloudinary, solo si la fila
+# todavía apunta al archivo local (pudo editarse o borrarse mientras tanto)
+_SWAP_IMAGE_SQL = {
+    "wish1": "UPDATE wishes SET wish1_img = %s WHERE participant_id = %s AND wish1_img = %s;",
+    "wish2": "UPDATE wishes SET wish2_img = %s WHERE participant_id = %s AND wish2_img = %s;",
+    "food": "UPDATE foods SET image_filename = %s WHERE id = %s AND image_filename = %s;",
+}
+
+
+def queue_cloudinary_upload(kind: str, row_id: int, local_name: str, folder: str) -> None:
+    """
+    Programa la subida de una imagen local a Cloudinary.
+    Llamar DESPUÉS del commit que guarda local_name en la BD.
+    Sin Cloudinary configurado, la imagen simplemente se queda local.
+    """
+    if not CLOUDINARY_URL:
+        return
+    UPLOAD_EXECUTOR.submit(upload_and_swap, kind, row_id, local_name, folder)
+
+
+def upload_and_swap(kind: str, row_id: int, local_name: str, folder: str) -> None:
+    """Sube la imagen local y actualiza la fila con la URL (corre fuera del request)."""
+    try:
+        path = os.path.join(app.config["UPLOAD_FOLDER"], local_name)
+        url = upload_to_cloudinary(path, folder)
+        if not url:
+            # Fallback: se queda el archivo local (lo sirve Flask, no el CDN)
+            app.logger.warning("Imagen %s se queda local: no se pudo subir a Cloudinary", local_name)
+            return
+
+        with db_cursor() as c:
+            c.execute(_SWAP_IMAGE_SQL[kind], (url, row_id, local_name))
+
+        if kind == "food":
+            cache.delete_memoized(_foods_page)
+        else:
+            cache.delete_memoized(_wishes_for, row_id)
+
+        remove_local_image(local_name)
+    except Exception as e:
+        app.logger.exception("Error cambiando %s por su URL de Cloudinary: %s", local_name, e)
+
+
+# La cola de subidas vive en memoria: si un worker muere antes de
+# terminar, la imagen se queda local. Cada worker revisa de vez en cuando
+# y vuelve a subir lo pendiente. (Tras un deploy en Render el disco llega
+# vacío: esas fotos ya no existen y se quedan como están.)
+PENDING_UPLOADS_LOCK_ID = 918274
+
+# Solo se re-suben imágenes con más de 5 minutos (las recientes todavía
+# pueden estar en la cola de algún worker vivo)
+PENDING_UPLOAD_MIN_AGE = 5 * 60
+
+# Cada cuánto se revisan las subidas pendientes (en cada worker)
+PENDING_UPLOAD_SWEEP_INTERVAL = 10 * 60
+
+_PENDING_UPLOADS_SQL = """
+    SELECT 'wish1' AS kind, w.participant_id AS row_id, w.wish1_img AS local_name,
+           'intercambio-navidad/deseos/' || p.name AS folder
+    FROM wishes w JOIN participants p ON p.id = w.participant_id
+    WHERE w.wish1_img IS NOT NULL AND w.wish1_img NOT LIKE 'http%'
+    UNION ALL
+    SELECT 'wish2', w.participant_id, w.wish2_img,
+           'intercambio-navidad/deseos/' || p.name
+    FROM wishes w JOIN participants p ON p.id = w.participant_id
+    WHERE w.wish2_img IS NOT NULL AND w.wish2_img NOT LIKE 'http%'
+    UNION ALL
+    SELECT 'food', id, image_filename,
+           'intercambio-navidad/comidas/' || person_name
+    FROM foods
+    WHERE image_filename IS NOT NULL AND image_filename NOT LIKE 'http%';
+"""
+
+
+def push_pending_uploads() -> None:
+    """
+    Sube a Cloudinary las imágenes que se quedaron locales.
+    El advisory lock evita que varios workers lo hagan a la vez. Vive en
+    una conexión aparte (fuera del pool, en autocommit): no ocupa un lugar
+    del pool ni deja una transacción abierta mientras se sube todo.
+    """
+    conn = None
+    try:
+        conn = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+        conn.autocommit = True
+
+        with conn.cursor() as c:
+            c.execute("SELECT pg_try_advisory_lock(%s);", (PENDING_UPLOADS_LOCK_ID,))
+            if not c.fetchone()["pg_try_advisory_lock"]:
+                return
+            c.execute(_PENDING_UPLOADS_SQL)
+            rows = c.fetchall()
+
+        cutoff = time.time() - PENDING_UPLOAD_MIN_AGE
+        for row in rows:
+            path = os.path.join(app.config["UPLOAD_FOLDER"], row["local_name"])
+            try:
+                if os.path.getmtime(path) > cutoff:
+                    continue
+            except FileNotFoundError:
+                # Se perdió (p. ej. otro servidor / disco efímero)
+                continue
+            upload_and_swap(row["kind"], row["row_id"], row["local_name"], row["folder"])
+    except Exception as e:
+        app.logger.exception("Error re-subiendo imágenes pendientes: %s", e)
+    finally:
+        # Cerrar la conexión también suelta el advisory lock
+        if conn is not None:
+            conn.close()
+
+
+def pending_uploads_loop() -> None:
+    """Hilo de cada worker: revisa las subidas pendientes cada cierto tiempo."""
+    while True:
+        time.sleep(PENDING_UPLOAD_SWEEP_INTERVAL)
+        push_pending_uploads()
+
+
+_pending_sweeper_started = False
+_pending_sweeper_lock = threading.Lock()
+
+
+def start_pending_uploads_sweeper() -> None:
+    """Arranca pending_uploads_loop una sola vez por proceso."""
+    global _pending_sweeper_started
+    with _pending_sweeper_lock:
+        if _pending_sweeper_started:
+            return
+        _pending_sweeper_started = True
+
+    threading.Thread(
+        target=pending_uploads_loop,
+        name="cloudinary-pendientes",
+        daemon=True
+    ).start()
+
+
 # -----------------------
 # CONEXIÓN A LA BD
 # -----------------------
-def get_db():
-    """
-    Conecta a PostgreSQL usando DATABASE_URL.
-    """
+def check_database_url():
     if not DATABASE_URL:
         raise RuntimeError(
             "DATABASE_URL no está definida. "
             "Créala en .env con tu External Database URL de Render."
         )
-    conn = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+
+
+def gevent_wait_callback(conn, timeout=None):
+    """
+    Espera a Postgres cediendo el turno a otros greenlets en lugar de
+    bloquear todo el worker (es el callback de psycogreen).
+    wait_read / wait_write se importan abajo, al instalarlo.
+    """
+    while True:
+        state = conn.poll()
+        if state == psycopg2.extensions.POLL_OK:
+            break
+        elif state == psycopg2.extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == psycopg2.extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise psycopg2.OperationalError(f"Resultado inesperado de poll: {state!r}")
+
+
+def running_under_gevent() -> bool:
+    """True si gevent ya parchó los sockets (worker gevent de Gunicorn)."""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("socket")
+
+
+# Con workers gevent, psycopg2 (que es C y no se deja parchar) bloquearía
+# todo el proceso en cada consulta; el callback lo hace cooperativo.
+# Se instala antes de abrir cualquier conexión.
+if running_under_gevent():
+    from gevent.socket import wait_read, wait_write
+    psycopg2.extensions.set_wait_callback(gevent_wait_callback)
+
+
+# Pool de conexiones compartido por todo el proceso: evita abrir una
+# conexión nueva (TCP + TLS + auth) a Render en cada request.
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+
+# Con muchos greenlets (o hilos) por worker, si todas las conexiones están
+# ocupadas se espera turno en vez de recibir PoolError ("pool exhausted")
+_POOL_SLOTS = threading.BoundedSemaphore(DB_POOL_MAX)
+
+
+class PreparedConnection(psycopg2.extensions.connection):
+    """Conexión del pool que recuerda si ya preparó las consultas frecuentes."""
+    prepared = False
+
+
+# Consultas de las páginas que más se visitan. Se preparan una vez por
+# conexión (Postgres ya no las vuelve a analizar ni planear) y se llaman
+# con EXECUTE nombre(...).
+# login_user recibe bigint: el id viene del formulario y puede ser enorme
+# (con integer truena "out of range"; id = bigint sigue usando el índice).
+_PREPARED_STATEMENTS = (
+    """
+    PREPARE login_user (bigint) AS
+    SELECT id, name, code, gives_to FROM participants WHERE id = $1 LIMIT 1;
+    """,
+    """
+    PREPARE my_wishes (integer) AS
+    SELECT wish1, wish1_img, wish2, wish2_img
+    FROM wishes WHERE participant_id = $1;
+    """,
+    """
+    PREPARE receiver_wishes (integer) AS
+    SELECT p.id, p.name,
+           w.participant_id AS w_participant_id,
+           w.wish1, w.wish1_img, w.wish2, w.wish2_img
+    FROM participants p
+    LEFT JOIN wishes w ON w.participant_id = p.id
+    WHERE p.id = $1;
+    """,
+)
+
+
+def prepare_statements(conn) -> None:
+    """Prepara _PREPARED_STATEMENTS en una conexión nueva del pool."""
+    with conn.cursor() as c:
+        for sql in _PREPARED_STATEMENTS:
+            c.execute(sql)
+    conn.commit()
+    conn.prepared = True
+
+
+POOL = None
+if DATABASE_URL:
+    POOL = ThreadedConnectionPool(
+        minconn=1,
+        maxconn=DB_POOL_MAX,
+        dsn=DATABASE_URL,
+        connection_factory=PreparedConnection,
+        cursor_factory=RealDictCursor
+    )
+    atexit.register(POOL.closeall)
+
+
+def get_db():
+    """
+    Saca una conexión del pool (esperando si no hay libres).
+    Hay que devolverla con put_db(); normalmente se usa db_cursor()
+    que ya lo hace.
+    """
+    check_database_url()
+    _POOL_SLOTS.acquire()
+    try:
+        conn = POOL.getconn()
+    except Exception:
+        _POOL_SLOTS.release()
+        raise
+
+    # Conexión recién abierta por el pool: preparar las consultas
+    if not conn.prepared:
+        try:
+            prepare_statements(conn)
+        except Exception:
+            # El rollback no deshace un PREPARE: si falló a medias, la
+            # conexión ya no se puede volver a preparar. Se descarta.
+            try:
+                POOL.putconn(conn, close=True)
+            finally:
+                _POOL_SLOTS.release()
+            raise
     return conn
 
 
+def put_db(conn) -> None:
+    """Devuelve una conexión al pool (si se rompió, el pool la descarta)."""
+    try:
+        POOL.putconn(conn, close=conn.closed != 0)
+    finally:
+        _POOL_SLOTS.release()
+
+
+@contextmanager
+def db_cursor(cursor_factory=None):
+    """
+    Cursor sobre una conexión del pool. Al salir del `with` hace commit
+    (o rollback si hubo error) y devuelve la conexión al pool.
+    """
+    conn = get_db()
+    try:
+        with conn:
+            with conn.cursor(cursor_factory=cursor_factory) as c:
+                yield c
+    finally:
+        put_db(conn)
+
+
+# Versión del esquema y de los datos iniciales.
+# Súbela cada vez que cambie lo que hace init_db_inner().
+SCHEMA_VERSION = 2
+
+# Id arbitrario del advisory lock de Postgres que protege init_db()
+INIT_DB_LOCK_ID = 918273
+
+
 def init_db():
+    """
+    Inicializa / sincroniza la BD una sola vez aunque arranquen
+    varios workers de Gunicorn al mismo tiempo.
+    Usa una conexión aparte porque corre antes de atender requests.
+    """
+    check_database_url()
+    conn = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+    c = conn.cursor()
+
+    try:
+        c.execute("SELECT pg_try_advisory_lock(%s);", (INIT_DB_LOCK_ID,))
+        if not c.fetchone()["pg_try_advisory_lock"]:
+            # Otro worker ya la está inicializando
+            return
+
+        try:
+            updated = init_db_inner(conn)
+        finally:
+            conn.rollback()
+            c.execute("SELECT pg_advisory_unlock(%s);", (INIT_DB_LOCK_ID,))
+    finally:
+        conn.close()
+
+    cache.delete_memoized(_participants_list)
+    if updated:
+        print("Base de datos PostgreSQL inicializada / sincronizada.")
+
+
+def init_db_inner(conn) -> bool:
     """
     Crea tablas en PostgreSQL si no existen
     y llena la tabla de participantes (idempotente).
+    Si la BD ya está en SCHEMA_VERSION no hace nada y regresa False.
     """
-    conn = get_db()
     c = conn.cursor()
 
+    c.execute("CREATE TABLE IF NOT EXISTS schema_meta (version INTEGER NOT NULL);")
+    c.execute("SELECT version FROM schema_meta;")
+    row = c.fetchone()
+    if row and row["version"] == SCHEMA_VERSION:
+        conn.commit()
+        return False
+
     # Tabla de participantes (quién es, código, y a quién le da regalo)
     c.execute("""
         CREATE TABLE IF NOT EXISTS participants (
@@ -134,33 +632,48 @@ def init_db():
         );
     """)
 
+    # Índices para las búsquedas frecuentes
+    # (wishes.participant_id ya tiene índice por ser UNIQUE y el
+    # ORDER BY id DESC de foods usa la llave primaria al revés)
+    # El login busca por id y lee name, code y gives_to: con INCLUDE
+    # Postgres lo resuelve solo con el índice (index-only scan)
+    c.execute("DROP INDEX IF EXISTS idx_participants_code;")
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_participants_id_covering
+        ON participants(id) INCLUDE (name, code, gives_to);
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_foods_person ON foods(person_name);")
+
     # -------------------------
     # Insertar participantes
     # -------------------------
     participants = [
-        ("Miguel",          "M123", None),
-        ("Mamá",            "MA45", None),
-        ("Papá Luis",       "PL67", None),
-        ("Abuelita María",  "AM89", None),
-        ("Luis Consentido", "LC11", None),
-        ("Daniela",         "DA22", None),
-        ("Efraín",          "EF33", None),
-        ("Karla",           "KA44", None),
-        ("Mariana",         "MA55", None),
-        ("Sandra",          "SA66", None),
-        ("Alejandro",       "AL77", None),
-        ("Brenda",          "BR88", None),
+        ("Miguel",          "M123"),
+        ("Mamá",            "MA45"),
+        ("Papá Luis",       "PL67"),
+        ("Abuelita María",  "AM89"),
+        ("Luis Consentido", "LC11"),
+        ("Daniela",         "DA22"),
+        ("Efraín",          "EF33"),
+        ("Karla",           "KA44"),
+        ("Mariana",         "MA55"),
+        ("Sandra",          "SA66"),
+        ("Alejandro",       "AL77"),
+        ("Brenda",          "BR88"),
     ]
 
-    for name, code, gives_to in participants:
-        c.execute(
-            """
-            INSERT INTO participants (name, code, gives_to)
-            VALUES (%s, %s, %s)
-            ON CONFLICT (name) DO NOTHING;
-            """,
-            (name, code, gives_to)
-        )
+    # Un solo INSERT para todos (en lugar de uno por participante);
+    # gives_to se llena abajo con las asignaciones
+    execute_values(
+        c,
+        """
+        INSERT INTO participants (name, code)
+        VALUES %s
+        ON CONFLICT (name) DO NOTHING;
+        """,
+        participants,
+        template="(%s, %s)"
+    )
 
     # Mapeo: quien le da regalo a quién (por nombre)
     asignaciones = {
@@ -178,29 +691,82 @@ def init_db():
         "Brenda":          "Alejandro",
     }
 
-    # Actualizar gives_to usando los nombres
-    for giver_name, receiver_name in asignaciones.items():
-        c.execute("SELECT id FROM participants WHERE name = %s;", (receiver_name,))
-        receiver_row = c.fetchone()
-        if receiver_row:
-            receiver_id = receiver_row["id"]
-            c.execute(
-                "UPDATE participants SET gives_to = %s WHERE name = %s;",
-                (receiver_id, giver_name)
-            )
+    # Actualizar gives_to usando los nombres, resolviendo los ids en SQL
+    # con un solo UPDATE (en lugar de SELECT + UPDATE por cada persona)
+    execute_values(
+        c,
+        """
+        UPDATE participants g
+        SET gives_to = r.id
+        FROM (VALUES %s) AS a(giver, receiver)
+        JOIN participants r ON r.name = a.receiver
+        WHERE g.name = a.giver;
+        """,
+        list(asignaciones.items()),
+        template="(%s, %s)"
+    )
+
+    # Guardar la versión para que los siguientes arranques se salten todo
+    c.execute("DELETE FROM schema_meta;")
+    c.execute("INSERT INTO schema_meta (version) VALUES (%s);", (SCHEMA_VERSION,))
 
     conn.commit()
-    conn.close()
-    print("Base de datos PostgreSQL inicializada / sincronizada.")
+    return True
+
+
+@cache.memoize(timeout=3600)
+def _participants_list():
+    """
+    Lista de participantes para el login. Solo cambia en init_db(),
+    así que se guarda en la caché (compartida entre workers con Redis).
+    """
+    with db_cursor() as c:
+        c.execute("SELECT id, name FROM participants ORDER BY name;")
+        return [dict(row) for row in c.fetchall()]
+
+
+@app.cli.command("init-db")
+def init_db_command():
+    """Crea / sincroniza la BD (correr una vez por deploy: flask --app app init-db)."""
+    init_db()
 
 
-# Inicializar la BD si no existe (o sincronizar)
-init_db()
+# Los workers ya no inicializan la BD al arrancar: hay que correr
+# `flask --app app init-db` en cada deploy (crea las tablas nuevas y
+# aplica los cambios de SCHEMA_VERSION).
+# - Render NO corre la línea release: del Procfile. Pon ese comando como
+#   "Pre-Deploy Command" del servicio, o (si el plan no lo tiene) define
+#   RUN_INIT_DB=1: cada worker lo intenta al arrancar, pero con el
+#   advisory lock y SCHEMA_VERSION solo uno hace el trabajo.
+# - Heroku y parecidos sí corren la línea release: del Procfile.
+if os.getenv("RUN_INIT_DB") == "1":
+    init_db()
 
 
 # -----------------------
 # RUTAS
 # -----------------------
+@app.before_request
+def start_background_jobs():
+    # Se arranca con el primer request del worker (y no al importar,
+    # para que `flask init-db` no se quede re-subiendo imágenes)
+    if CLOUDINARY_URL and DATABASE_URL and not _pending_sweeper_started:
+        start_pending_uploads_sweeper()
+
+
+@app.after_request
+def cache_uploads(response):
+    if response.status_code in (200, 304) and request.path.startswith(UPLOADS_URL_PREFIX):
+        response.headers['Cache-Control'] = UPLOADS_CACHE_CONTROL
+    return response
+
+
+@app.errorhandler(413)
+def request_too_large(error):
+    flash("La imagen es demasiado grande (máximo 16 MB).", "danger")
+    return redirect(request.path)
+
+
 @app.route("/")
 def index():
     return render_template("index.html")
@@ -213,27 +779,29 @@ def login():
     - Ver mi intercambio (next=gift)
     - Mi lista de deseos (next=dashboard)
     """
-    conn = get_db()
-    c = conn.cursor()
-    c.execute("SELECT id, name FROM participants ORDER BY name;")
-    participants = c.fetchall()
-
     # De dónde venimos: ?next=gift o ?next=dashboard
     next_page = request.args.get("next") or request.form.get("next") or "dashboard"
 
     if request.method == "POST":
-        participant_id = request.form.get("participant_id")
+        participant_id = request.form.get("participant_id", type=int)
         code = request.form.get("code", "").strip()
 
-        c.execute(
-            "SELECT * FROM participants WHERE id = %s AND code = %s;",
-            (participant_id, code)
-        )
-        user = c.fetchone()
-        conn.close()
-
-        if user:
-            session["user_id"] = user["id"]
+        # Una sola consulta: buscar por la llave primaria
+        # y comparar el código en tiempo constante
+        user = None
+        if participant_id is not None:
+            with db_cursor() as c:
+                c.execute("EXECUTE login_user (%s);", (participant_id,))
+                user = c.fetchone()
+
+        if user and hmac.compare_digest(user["code"].encode(), code.encode()):
+            # Guardar el usuario en la sesión para no consultarlo en cada página
+            # (sin el código: con sesión en cookie se podría leer)
+            session["user"] = {
+                "id": user["id"],
+                "name": user["name"],
+                "gives_to": user["gives_to"],
+            }
             # Redirigir según lo que se pidió
             if next_page == "gift":
                 return redirect(url_for("gift"))
@@ -243,26 +811,19 @@ def login():
             flash("Nombre o código incorrecto. Inténtalo de nuevo.", "danger")
             return redirect(url_for("login", next=next_page))
 
-    conn.close()
+    # La lista de nombres solo hace falta para pintar el formulario
+    participants = _participants_list()
     return render_template("login.html", participants=participants)
 
 
 def get_logged_user():
-    user_id = session.get("user_id")
-    if not user_id:
-        return None
-
-    conn = get_db()
-    c = conn.cursor()
-    c.execute("SELECT * FROM participants WHERE id = %s;", (user_id,))
-    user = c.fetchone()
-    conn.close()
-    return user
+    """El usuario se guarda en la sesión al hacer login: no hay consulta a la BD."""
+    return session.get("user")
 
 
 @app.route("/logout")
 def logout():
-    session.pop("user_id", None)
+    session.pop("user", None)
     flash("Sesión cerrada.", "info")
     return redirect(url_for("index"))
 
@@ -278,76 +839,71 @@ def dashboard():
     if not user:
         return redirect(url_for("login", next="dashboard"))
 
-    conn = get_db()
-    c = conn.cursor()
-
-    # Tus propios deseos de regalo (para que tú los edites)
-    c.execute(
-        "SELECT * FROM wishes WHERE participant_id = %s;",
-        (user["id"],)
-    )
-    my_wishes = c.fetchone()
-
     if request.method == "POST":
         # Guardar / actualizar tus deseos
         wish1 = request.form.get("wish1", "").strip()
         wish2 = request.form.get("wish2", "").strip()
 
-        # Empezar con lo que ya había (si existe)
-        wish1_img = my_wishes["wish1_img"] if my_wishes else None
-        wish2_img = my_wishes["wish2_img"] if my_wishes else None
+        # None = conservar la foto que ya había (ver COALESCE abajo)
+        wish1_img = None
+        wish2_img = None
+
+        folder = f"intercambio-navidad/deseos/{user['name']}"
 
-        # Manejar foto para deseo 1
+        # Manejar foto para deseo 1 (se guarda local y luego se sube)
         file1 = request.files.get("wish1_img")
         if file1 and file1.filename and allowed_file(file1.filename):
-            # Primero intentamos Cloudinary
-            url1 = upload_to_cloudinary(file1, folder=f"intercambio-navidad/deseos/{user['name']}")
-            if url1:
-                wish1_img = url1
-            else:
-                # Fallback: guardar local
-                filename1 = secure_filename(file1.filename)
-                local_name1 = f"w1_{user['id']}_{filename1}"
-                file1.save(os.path.join(app.config["UPLOAD_FOLDER"], local_name1))
-                wish1_img = local_name1
+            wish1_img = save_local_image(file1, local_image_name(f"w1_{user['id']}", file1.filename))
 
         # Manejar foto para deseo 2
         file2 = request.files.get("wish2_img")
         if file2 and file2.filename and allowed_file(file2.filename):
-            url2 = upload_to_cloudinary(file2, folder=f"intercambio-navidad/deseos/{user['name']}")
-            if url2:
-                wish2_img = url2
-            else:
-                filename2 = secure_filename(file2.filename)
-                local_name2 = f"w2_{user['id']}_{filename2}"
-                file2.save(os.path.join(app.config["UPLOAD_FOLDER"], local_name2))
-                wish2_img = local_name2
+            wish2_img = save_local_image(file2, local_image_name(f"w2_{user['id']}", file2.filename))
 
-        # Si ya tiene fila en wishes, actualizar; si no, crear
-        if my_wishes:
-            c.execute(
-                """
-                UPDATE wishes
-                SET wish1 = %s, wish1_img = %s, wish2 = %s, wish2_img = %s
-                WHERE participant_id = %s;
-                """,
-                (wish1, wish1_img, wish2, wish2_img, user["id"])
-            )
-        else:
+        # Crear o actualizar en un solo paso; el CTE ve la fila como estaba
+        # antes del INSERT, así que regresa las fotos que había (sin FOR
+        # UPDATE: esa lectura se saltaría la fila que acaba de cambiar)
+        with db_cursor() as c:
             c.execute(
                 """
+                WITH old AS (
+                    SELECT wish1_img, wish2_img FROM wishes
+                    WHERE participant_id = %s
+                )
                 INSERT INTO wishes (participant_id, wish1, wish1_img, wish2, wish2_img)
-                VALUES (%s, %s, %s, %s, %s);
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (participant_id) DO UPDATE
+                SET wish1 = EXCLUDED.wish1,
+                    wish1_img = COALESCE(EXCLUDED.wish1_img, wishes.wish1_img),
+                    wish2 = EXCLUDED.wish2,
+                    wish2_img = COALESCE(EXCLUDED.wish2_img, wishes.wish2_img)
+                RETURNING (SELECT wish1_img FROM old) AS old_wish1_img,
+                          (SELECT wish2_img FROM old) AS old_wish2_img;
                 """,
-                (user["id"], wish1, wish1_img, wish2, wish2_img)
+                (user["id"], user["id"], wish1, wish1_img, wish2, wish2_img)
             )
+            old = c.fetchone()
+
+        cache.delete_memoized(_wishes_for, user["id"])
+
+        # Las fotos reemplazadas ya no se usan (solo se borran las locales)
+        if wish1_img:
+            remove_local_image(old["old_wish1_img"])
+        if wish2_img:
+            remove_local_image(old["old_wish2_img"])
+
+        if wish1_img:
+            queue_cloudinary_upload("wish1", user["id"], wish1_img, folder)
+        if wish2_img:
+            queue_cloudinary_upload("wish2", user["id"], wish2_img, folder)
 
-        conn.commit()
-        conn.close()
         flash("Tu lista de deseos se guardó correctamente.", "success")
         return redirect(url_for("dashboard"))
 
-    conn.close()
+    # Tus propios deseos de regalo (para que tú los edites)
+    with db_cursor() as c:
+        c.execute("EXECUTE my_wishes (%s);", (user["id"],))
+        my_wishes = c.fetchone()
 
     return render_template(
         "dashboard.html",
@@ -363,42 +919,58 @@ def delete_wishes():
     if not user:
         return redirect(url_for("login", next="dashboard"))
 
-    conn = get_db()
-    c = conn.cursor()
-
-    # Buscar nombres de archivos para borrarlos del disco (solo si no son URLs)
-    c.execute(
-        "SELECT wish1_img, wish2_img FROM wishes WHERE participant_id = %s;",
-        (user["id"],)
-    )
-    row = c.fetchone()
-
-    if row:
-        for col in ("wish1_img", "wish2_img"):
-            filename = row[col]
-            if filename and not is_cloud_url(filename):
-                path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-                if os.path.exists(path):
-                    try:
-                        os.remove(path)
-                    except OSError:
-                        pass
-
-        # Borrar registro de deseos
+    # Borrar registro de deseos y, de paso, saber qué fotos tenía
+    with db_cursor() as c:
         c.execute(
-            "DELETE FROM wishes WHERE participant_id = %s;",
+            """
+            DELETE FROM wishes WHERE participant_id = %s
+            RETURNING wish1_img, wish2_img;
+            """,
             (user["id"],)
         )
-        conn.commit()
+        row = c.fetchone()
+
+    cache.delete_memoized(_wishes_for, user["id"])
+
+    if row:
+        # Borrar las fotos del disco (solo si no son URLs)
+        remove_local_image(row["wish1_img"])
+        remove_local_image(row["wish2_img"])
         flash("Tu lista de deseos se borró correctamente.", "info")
     else:
         flash("No tenías lista de deseos guardada.", "info")
 
-    conn.close()
     return redirect(url_for("dashboard"))
 
 
 # --------- VER MI INTERCAMBIO -------------
+@cache.memoize(timeout=300, unless=cache_not_shared)
+def _wishes_for(pid):
+    """
+    Persona a la que se le da regalo y su lista de deseos (o None).
+    Con Redis se guarda en la caché por participante; dashboard,
+    delete_wishes y la subida a Cloudinary la invalidan cuando cambian
+    los deseos.
+    """
+    with db_cursor() as c:
+        c.execute("EXECUTE receiver_wishes (%s);", (pid,))
+        row = c.fetchone()
+
+    if not row:
+        return None, None
+
+    receiver = {"id": row["id"], "name": row["name"]}
+    receiver_wishes = None
+    if row["w_participant_id"] is not None:
+        receiver_wishes = {
+            "wish1": row["wish1"],
+            "wish1_img": row["wish1_img"],
+            "wish2": row["wish2"],
+            "wish2_img": row["wish2_img"],
+        }
+    return receiver, receiver_wishes
+
+
 @app.route("/gift")
 def gift():
     """
@@ -410,27 +982,12 @@ def gift():
     if not user:
         return redirect(url_for("login", next="gift"))
 
-    conn = get_db()
-    c = conn.cursor()
-
     receiver = None
     receiver_wishes = None
 
+    # gives_to viene en la sesión; persona y deseos salen de la caché
     if user["gives_to"]:
-        c.execute(
-            "SELECT * FROM participants WHERE id = %s;",
-            (user["gives_to"],)
-        )
-        receiver = c.fetchone()
-
-        if receiver:
-            c.execute(
-                "SELECT * FROM wishes WHERE participant_id = %s;",
-                (receiver["id"],)
-            )
-            receiver_wishes = c.fetchone()
-
-    conn.close()
+        receiver, receiver_wishes = _wishes_for(user["gives_to"])
 
     return render_template(
         "gift.html",
@@ -443,13 +1000,44 @@ def gift():
 # -----------------------
 # COMIDAS
 # -----------------------
+# Platillos por página en /comidas
+FOODS_PAGE_SIZE = 20
+
+# Fila de la tabla foods para el listado (mismo orden que el SELECT)
+FoodRow = namedtuple(
+    "FoodRow",
+    ["id", "person_name", "title", "description", "image_filename"]
+)
+
+
+@cache.memoize(timeout=120, unless=cache_not_shared)
+def _foods_page(before):
+    """
+    Una página del listado de comidas (platillos con id < before).
+    Trae un platillo de más (FOODS_PAGE_SIZE + 1) solo para saber si
+    hay otra página después.
+    Se lee mucho y se escribe poco: con Redis se guarda en la caché y
+    cualquier alta, edición o borrado invalida todas las páginas.
+    """
+    # Solo lectura: cursor de tuplas (más barato que un dict por fila)
+    with db_cursor(cursor_factory=psycopg2.extensions.cursor) as c:
+        c.execute(
+            """
+            SELECT id, person_name, title, description, image_filename
+            FROM foods
+            WHERE %s IS NULL OR id < %s
+            ORDER BY id DESC
+            LIMIT %s;
+            """,
+            (before, before, FOODS_PAGE_SIZE + 1)
+        )
+        return [FoodRow(*row) for row in c.fetchall()]
+
+
 @app.route("/comidas", methods=["GET", "POST"])
 def foods():
     user = get_logged_user()
 
-    conn = get_db()
-    c = conn.cursor()
-
     if request.method == "POST":
         person_name = request.form.get("person_name", "").strip()
         title = request.form.get("title", "").strip()
@@ -458,54 +1046,70 @@ def foods():
         if not person_name:
             person_name = user["name"] if user else "Invitado"
 
-        img_filename = None
-        file = request.files.get("food_img")
-        if file and file.filename and allowed_file(file.filename):
-            # Primero intentamos Cloudinary
-            url = upload_to_cloudinary(file, folder=f"intercambio-navidad/comidas/{person_name}")
-            if url:
-                img_filename = url
-            else:
-                # Fallback: local
-                filename = secure_filename(file.filename)
-                local_name = f"food_{person_name}_{filename}"
-                file.save(os.path.join(app.config["UPLOAD_FOLDER"], local_name))
-                img_filename = local_name
-
         if title:
-            c.execute(
-                """
-                INSERT INTO foods (person_name, title, description, image_filename)
-                VALUES (%s, %s, %s, %s);
-                """,
-                (person_name, title, description, img_filename)
-            )
-            conn.commit()
+            img_filename = None
+            file = request.files.get("food_img")
+            if file and file.filename and allowed_file(file.filename):
+                img_filename = save_local_image(file, local_image_name("food", file.filename))
+
+            with db_cursor() as c:
+                c.execute(
+                    """
+                    INSERT INTO foods (person_name, title, description, image_filename)
+                    VALUES (%s, %s, %s, %s)
+                    RETURNING id;
+                    """,
+                    (person_name, title, description, img_filename)
+                )
+                food_id = c.fetchone()["id"]
+
+            cache.delete_memoized(_foods_page)
+
+            if img_filename:
+                queue_cloudinary_upload("food", food_id, img_filename,
+                                        f"intercambio-navidad/comidas/{person_name}")
+
             flash("Comida registrada para la cena de Navidad.", "success")
         else:
             flash("El título de la comida es obligatorio.", "danger")
 
-        conn.close()
         return redirect(url_for("foods"))
 
-    c.execute("SELECT * FROM foods ORDER BY id DESC;")
-    foods_list = c.fetchall()
-    conn.close()
+    # Paginación por llave (?before=<id>): cada página cuesta lo mismo
+    # sin importar qué tan atrás se esté
+    before = request.args.get("before", type=int)
 
-    return render_template("foods.html", foods_list=foods_list, user=user)
+    rows = _foods_page(before)
+    foods_list = rows[:FOODS_PAGE_SIZE]
+
+    # Solo hay "ver más" si de verdad llegó el platillo de más
+    next_before = None
+    if len(rows) > FOODS_PAGE_SIZE:
+        next_before = foods_list[-1].id
+
+    return render_template(
+        "foods.html",
+        foods_list=foods_list,
+        user=user,
+        before=before,
+        next_before=next_before
+    )
 
 
 @app.route("/comidas/editar/<int:food_id>", methods=["GET", "POST"])
 def edit_food(food_id):
     """Editar un platillo existente."""
-    conn = get_db()
-    c = conn.cursor()
-
-    c.execute("SELECT * FROM foods WHERE id = %s;", (food_id,))
-    food = c.fetchone()
+    with db_cursor() as c:
+        c.execute(
+            """
+            SELECT person_name, title, description, image_filename
+            FROM foods WHERE id = %s;
+            """,
+            (food_id,)
+        )
+        food = c.fetchone()
 
     if not food:
-        conn.close()
         flash("Platillo no encontrado.", "danger")
         return redirect(url_for("foods"))
 
@@ -515,66 +1119,58 @@ def edit_food(food_id):
         description = request.form.get("description", "").strip()
 
         if not title:
-            conn.close()
             flash("El nombre del platillo es obligatorio.", "danger")
             return redirect(url_for("edit_food", food_id=food_id))
 
-        img_filename = food["image_filename"]
+        # None = conservar la imagen que tenga la fila al momento del UPDATE
+        # (la subida en segundo plano pudo cambiarla ya por la URL de Cloudinary)
+        img_filename = None
 
         file = request.files.get("food_img")
         if file and file.filename and allowed_file(file.filename):
-            # Intentar subir nueva imagen a Cloudinary
-            url = upload_to_cloudinary(file, folder=f"intercambio-navidad/comidas/{person_name}")
-            if url:
-                img_filename = url
-            else:
-                # Si falla Cloudinary, fallback a local
-                filename = secure_filename(file.filename)
-                local_name = f"food_{person_name}_{filename}"
-                file.save(os.path.join(app.config["UPLOAD_FOLDER"], local_name))
-                img_filename = local_name
+            img_filename = save_local_image(file, local_image_name("food", file.filename))
 
-        c.execute(
-            """
-            UPDATE foods
-            SET person_name = %s, title = %s, description = %s, image_filename = %s
-            WHERE id = %s;
-            """,
-            (person_name, title, description, img_filename, food_id)
-        )
-        conn.commit()
-        conn.close()
+        with db_cursor() as c:
+            c.execute(
+                """
+                UPDATE foods
+                SET person_name = %s, title = %s, description = %s,
+                    image_filename = COALESCE(%s, image_filename)
+                WHERE id = %s;
+                """,
+                (person_name, title, description, img_filename, food_id)
+            )
+
+        cache.delete_memoized(_foods_page)
+
+        if img_filename:
+            # La foto anterior ya no se usa (los nombres locales ya no se repiten)
+            remove_local_image(food["image_filename"])
+            queue_cloudinary_upload("food", food_id, img_filename,
+                                    f"intercambio-navidad/comidas/{person_name}")
 
         flash("Platillo actualizado correctamente.", "success")
         return redirect(url_for("foods"))
 
-    conn.close()
     return render_template("foods_edit.html", food=food)
 
 
 @app.route("/comidas/eliminar/<int:food_id>", methods=["POST"])
 def delete_food(food_id):
     """Eliminar un platillo (y su imagen local si existe)."""
-    conn = get_db()
-    c = conn.cursor()
+    # Borrar el registro de la BD y, de paso, saber qué imagen tenía
+    with db_cursor() as c:
+        c.execute(
+            "DELETE FROM foods WHERE id = %s RETURNING image_filename;",
+            (food_id,)
+        )
+        row = c.fetchone()
 
-    # Buscar la imagen para borrarla del disco (solo si no es URL)
-    c.execute("SELECT image_filename FROM foods WHERE id = %s;", (food_id,))
-    row = c.fetchone()
-    if row and row["image_filename"]:
-        img = row["image_filename"]
-        if not is_cloud_url(img):
-            img_path = os.path.join(app.config["UPLOAD_FOLDER"], img)
-            if os.path.exists(img_path):
-                try:
-                    os.remove(img_path)
-                except OSError:
-                    pass  # si falla, no pasa nada grave
-
-    # Borrar el registro de la BD
-    c.execute("DELETE FROM foods WHERE id = %s;", (food_id,))
-    conn.commit()
-    conn.close()
+    cache.delete_memoized(_foods_page)
+
+    # Borrar la imagen del disco (solo si no es URL)
+    if row:
+        remove_local_image(row["image_filename"])
 
     flash("Platillo eliminado.", "info")
     return redirect(url_for("foods"))